@@ -1,9 +1,11 @@
 import argparse
 import asyncio
 import logging
+import sys
 from datetime import date, datetime
 
 from .main import main
+from .models import Market
 
 
 HELPS = '''
@@ -44,6 +46,16 @@ parser.add_argument(
     default='local',
     help='the target bucket to save, saving to local folder if not assigned'
 )
+parser.add_argument(
+    '-m',
+    '--market',
+    type=Market,
+    nargs='+',
+    choices=list(Market),
+    default=list(Market),
+    metavar='MARKET',
+    help='the markets to parse, twse (listed) or tpex (OTC), parsing all of them if not specify'
+)
 
 args = parser.parse_args()
 log_level = logging.DEBUG if args.verbose else logging.INFO
@@ -53,5 +65,7 @@ target_date = parse_date(args.date)
 target_dist = args.bucket
 
 logging.info(f'{datetime.now()} start')
-asyncio.run(main(target_date, target_dist))
+succeeded = asyncio.run(main(target_date, target_dist, args.market))
 logging.info(f'{datetime.now()} complete')
+if not succeeded:
+    sys.exit(1)
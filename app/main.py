@@ -1,20 +1,37 @@
 import asyncio
+import logging
 
-from app.managers import IndustryManager, StockManager
+from app.managers import CatalogueManager, IndustryManager, StockManager
+from app.models import Market
 
 
-async def main(target_date, target_dist):
-    stock_manager = StockManager()
+async def run(market, target_date, target_dist):
+    stock_manager = StockManager(market)
     await stock_manager.init()
 
     stocks = await stock_manager.get_stocks()
     stock_manager.save(stocks, dist=target_dist)
     await asyncio.sleep(2)
 
-    industry_manager = IndustryManager()
-    industries = await industry_manager.get_industries()
-    await asyncio.sleep(2)
+    catalogue_manager = CatalogueManager(market)
+    catalogue = await catalogue_manager.get_catalogue(stocks)
 
-    reports = await industry_manager.get_reports(industries, target_date)
-    top3_reports = await industry_manager.calculate_top3(reports, stocks)
+    industry_manager = IndustryManager(market)
+    reports = await industry_manager.get_reports(catalogue.reported_industries, target_date)
+    top3_reports, sector_stats = await industry_manager.calculate(reports, catalogue.index)
     industry_manager.save_top3_reports(top3_reports, dist=target_dist)
+    industry_manager.save_sector_stats(sector_stats, target_date, dist=target_dist)
+
+
+async def main(target_date, target_dist, markets=tuple(Market)) -> bool:
+    results = await asyncio.gather(
+        *[run(market, target_date, target_dist) for market in markets],
+        return_exceptions=True
+    )
+    succeeded = True
+    for market, result in zip(markets, results):
+        if isinstance(result, Exception):
+            logging.error(f'failed to parse {market.value}', exc_info=result)
+            succeeded = False
+
+    return succeeded
@@ -1,15 +1,24 @@
 import asyncio
-from collections import defaultdict
-from datetime import date
+import logging
+import numpy as np
+from datetime import date, datetime, timedelta
+from typing import Optional
 
-from app.models import Industry, IndustryReport, Stock
-from app.parsers import IndustryParser, IndustryReportParser, StockParser
-from app.utils import save_json_to_local, save_json_to_s3, split
+from app.models import Industry, IndustryCatalogue, IndustryReport, Market, Stock
+from app.parsers import IndustryReportParser, MARKET_PARSERS
+from app.utils import (
+    CACHE_STORAGE,
+    ConcurrencyController,
+    parse_numbers,
+    save_json_to_local,
+    save_json_to_s3
+)
 
 
 class StockManager:
-    def __init__(self):
-        self.parser = StockParser()
+    def __init__(self, market: Market = Market.TWSE):
+        self.market = market
+        self.parser = MARKET_PARSERS[market].stock()
     
     async def init(self):
         await self.parser.init_connect()
@@ -22,7 +31,7 @@ class StockManager:
         wanted = {'ticker', 'name', 'listed_at', 'industry'}
         data = [stock.dict(include=wanted) for stock in stocks]
 
-        filename = 'listed.json'
+        filename = f'{self.market.value}/listed.json'
         json_dump_conf = {'indent': 4, 'ensure_ascii': False}
         if dist == 'local':
             save_json_to_local(filename, data, json_dump_conf)
@@ -30,68 +39,295 @@ class StockManager:
             save_json_to_s3(filename, data, json_dump_conf)
 
 
+class CatalogueManager:
+    ttl: timedelta = timedelta(hours=12)
+    # catalogues loaded in this process, kept for warm invocations
+    catalogues: dict[Market, IndustryCatalogue] = {}
+
+    def __init__(self, market: Market = Market.TWSE):
+        self.market = market
+        self.industry_parser = MARKET_PARSERS[market].industry()
+        self.path = CACHE_STORAGE / f'{market.value}_catalogue.json'
+
+    def load(self) -> Optional[IndustryCatalogue]:
+        if (catalogue := self.catalogues.get(self.market)) is not None:
+            return catalogue
+        try:
+            catalogue = IndustryCatalogue.parse_file(self.path)
+        except (OSError, ValueError):
+            return None
+        self.catalogues[self.market] = catalogue
+        return catalogue
+
+    def save(self, catalogue: IndustryCatalogue):
+        self.catalogues[self.market] = catalogue
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(
+                catalogue.json(exclude={'index'}, ensure_ascii=False),
+                encoding='utf-8'
+            )
+        except OSError as e:
+            logging.warning(f'failed to cache the catalogue: {e}')
+
+    async def refresh(self) -> IndustryCatalogue:
+        industries = await self.industry_parser.get_industries()
+        await asyncio.sleep(2)
+        return IndustryCatalogue(
+            market=self.market,
+            industries=industries,
+            skip_industries=self.industry_parser.skip_industries,
+            updated_at=datetime.now()
+        )
+
+    async def get_catalogue(self, stocks: list[Stock]) -> IndustryCatalogue:
+        # only the industries are cached, the index is built once per run
+        # from the listing in hand so new or moved tickers are never dropped
+        catalogue = self.load()
+        if catalogue is None or catalogue.is_expired(self.ttl):
+            catalogue = await self.refresh()
+            self.save(catalogue)
+
+        index = IndustryCatalogue.build_index(stocks)
+        listed = set(index.values())
+        for industry in catalogue.reported_industries:
+            if industry.name not in listed:
+                logging.warning(
+                    f'{self.market.value} industry {industry.name} matches no listed stock'
+                )
+        return catalogue.copy(update={'index': index})
+
+
 class IndustryManager:
     concurrency: int = 2
+    min_concurrency: int = 1
+    max_concurrency: int = 4
+    target_latency: float = 2.0
 
-    def __init__(self):
-        self.industry_parser = IndustryParser()
-    
-    async def get_industries(self) -> list[Industry]:
-        return await self.industry_parser.get_industries()
+    def __init__(self, market: Market = Market.TWSE):
+        self.market = market
+
+    async def _fetch_reports(
+        self,
+        parser: IndustryReportParser,
+        queue: asyncio.Queue,
+        controller: ConcurrencyController,
+        reports: list[IndustryReport],
+        date_: date
+    ):
+        # take the slot before the industry, so that no industry waits behind
+        # a worker which is not allowed to send
+        while True:
+            async with controller:
+                if queue.empty():
+                    return
+                i, industry = queue.get_nowait()
+                failures = parser.failures
+                reports[i] = await parser.get_report(industry, date_)
+                controller.record(parser.latency, parser.failures > failures)
 
     async def get_reports(
         self,
         industries: list[Industry],
         date_: date
     ) -> list[IndustryReport]:
-        reports = []
-        chunks = split(industries, self.concurrency)
-        parsers = [IndustryReportParser() for _ in range(self.concurrency)]
-        await asyncio.gather(*[parser.init_connect() for parser in parsers])
+        # workers pull industries from the queue, the host pacing caps the
+        # request rate and the controller decides how many of them could be
+        # in flight under it
+        queue = asyncio.Queue()
+        for i, industry in enumerate(industries):
+            queue.put_nowait((i, industry))
+
+        controller = ConcurrencyController(
+            initial=self.concurrency,
+            minimum=self.min_concurrency,
+            maximum=self.max_concurrency,
+            target_latency=self.target_latency
+        )
+        parser_cls = MARKET_PARSERS[self.market].industry_report
+        parsers = [parser_cls() for _ in range(self.max_concurrency)]
+        await parsers[0].init_connect()
 
-        results = await asyncio.gather(
+        reports = [None] * len(industries)
+        await asyncio.gather(
             *[
-                parser.get_reports(chunk, date_)
-                for parser, chunk in zip(parsers, chunks)
+                self._fetch_reports(parser, queue, controller, reports, date_)
+                for parser in parsers
             ]
         )
-        for result in results:
-            reports.extend(result)
-
         return reports
 
-    async def _calculate_top3(self, report: IndustryReport, scope: set) -> dict:
-        data = []
-        for stock in report.stocks:
-            if stock.goes_up and stock.ticker in scope:
-                price = float(stock.price.replace(',', ''))
-                price_spread = float(stock.price_spread.replace(',', ''))
-                diff = price_spread / (price - price_spread) * 100
-                stock.diff = f'{round(diff, 2)}%'
-                data.append(stock.dict(include={'ticker', 'diff'}))
-
-        data.sort(key=lambda s: s['diff'], reverse=True)
+    def _build_frame(
+        self,
+        reports: list[IndustryReport],
+        index: dict[str, str]
+    ) -> dict[str, np.ndarray]:
+        # walk the reports once and lay the listed stocks of each industry out
+        # as columns, the group of a row is the index of its report
+        group, ticker, price, price_spread = [], [], [], []
+        goes_up, goes_down, not_comparable = [], [], []
+        for i, report in enumerate(reports):
+            name = report.industry.name
+            for stock in report.stocks:
+                if index.get(stock.ticker) != name:
+                    continue
+                group.append(i)
+                ticker.append(stock.ticker)
+                price.append(stock.price)
+                price_spread.append(stock.price_spread)
+                goes_up.append(bool(stock.goes_up))
+                goes_down.append(bool(stock.goes_down))
+                not_comparable.append(bool(stock.not_comparable))
+
+        price = parse_numbers(price)
+        price_spread = parse_numbers(price_spread)
+        # rows without trade or marked as not comparable have no move at all
+        comparable = (
+            ~np.array(not_comparable, dtype=bool) &
+            np.isfinite(price) &
+            np.isfinite(price_spread)
+        )
+        goes_up = np.array(goes_up, dtype=bool) & comparable
+        goes_down = np.array(goes_down, dtype=bool) & comparable
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            diff = np.where(
+                goes_up,
+                price_spread / (price - price_spread),
+                np.where(goes_down, -price_spread / (price + price_spread), 0.0)
+            ) * 100
+        diff[~comparable] = np.nan
+
         return {
-            'industry': report.industry.name,
-            'data': data[:3]
+            'group': np.array(group, dtype=int),
+            'ticker': np.array(ticker, dtype=object),
+            'comparable': comparable,
+            'goes_up': goes_up,
+            'goes_down': goes_down,
+            'diff': diff
         }
 
-    async def calculate_top3(
+    def _calculate_top3(
         self,
         reports: list[IndustryReport],
-        stocks: list[Stock]
+        frame: dict[str, np.ndarray]
     ) -> list[dict]:
-        scopes = defaultdict(set)
-        for stock in stocks:
-            scopes[stock.industry].add(stock.ticker)
+        wanted = frame['goes_up'] & np.isfinite(frame['diff'])
+        group = frame['group'][wanted]
+        ticker = frame['ticker'][wanted]
+        diff = frame['diff'][wanted]
 
-        results = await asyncio.gather(
-            *[
-                self._calculate_top3(report, scopes[report.industry.name])
-                for report in reports
+        order = np.lexsort((-diff, group))
+        group, ticker, diff = group[order], ticker[order], diff[order]
+        starts = np.searchsorted(group, np.arange(len(reports)))
+        top = np.arange(len(group)) - starts[group] < 3
+
+        data = [[] for _ in reports]
+        for i, ticker_, diff_ in zip(group[top], ticker[top], diff[top]):
+            data[i].append({'ticker': ticker_, 'diff': f'{round(diff_, 2)}%'})
+
+        return [
+            {'industry': report.industry.name, 'data': datum}
+            for report, datum in zip(reports, data)
+        ]
+
+    def _reduce_groups(
+        self,
+        group: np.ndarray,
+        frame: dict[str, np.ndarray],
+        size: int
+    ) -> dict[str, np.ndarray]:
+        count = np.bincount(group, minlength=size)
+        advancers = np.bincount(group[frame['goes_up']], minlength=size)
+        decliners = np.bincount(group[frame['goes_down']], minlength=size)
+        comparable = np.bincount(group[frame['comparable']], minlength=size)
+
+        valid = np.isfinite(frame['diff'])
+        group, diff = group[valid], frame['diff'][valid]
+        order = np.lexsort((diff, group))
+        group, diff = group[order], diff[order]
+        valid_count = np.bincount(group, minlength=size)
+        has_value = valid_count > 0
+
+        mean = np.full(size, np.nan)
+        sums = np.bincount(group, weights=diff, minlength=size)
+        mean[has_value] = sums[has_value] / valid_count[has_value]
+
+        median = np.full(size, np.nan)
+        starts = np.cumsum(valid_count) - valid_count
+        lower = (starts + (valid_count - 1) // 2)[has_value]
+        upper = (starts + valid_count // 2)[has_value]
+        median[has_value] = (diff[lower] + diff[upper]) / 2
+
+        up_ratio = np.full(size, np.nan)
+        up_ratio[comparable > 0] = advancers[comparable > 0] / comparable[comparable > 0]
+
+        return {
+            'count': count,
+            'advancers': advancers,
+            'decliners': decliners,
+            'unchanged': comparable - advancers - decliners,
+            'not_comparable': count - comparable,
+            'mean_diff': mean,
+            'median_diff': median,
+            'up_ratio': up_ratio
+        }
+
+    def _to_stats(self, reduced: dict[str, np.ndarray], i: int) -> dict:
+        def to_float(value, digits):
+            return None if np.isnan(value) else round(float(value), digits)
+
+        return {
+            'count': int(reduced['count'][i]),
+            'advancers': int(reduced['advancers'][i]),
+            'decliners': int(reduced['decliners'][i]),
+            'unchanged': int(reduced['unchanged'][i]),
+            'not_comparable': int(reduced['not_comparable'][i]),
+            'mean_diff': to_float(reduced['mean_diff'][i], 2),
+            'median_diff': to_float(reduced['median_diff'][i], 2),
+            'up_ratio': to_float(reduced['up_ratio'][i], 4)
+        }
+
+    def _calculate_sector_stats(
+        self,
+        reports: list[IndustryReport],
+        frame: dict[str, np.ndarray]
+    ) -> dict:
+        industries = self._reduce_groups(frame['group'], frame, len(reports))
+        market = self._reduce_groups(np.zeros_like(frame['group']), frame, 1)
+        return {
+            'market': self._to_stats(market, 0),
+            'industries': [
+                {'industry': report.industry.name, **self._to_stats(industries, i)}
+                for i, report in enumerate(reports)
             ]
-        )
-        return results
+        }
+
+    async def calculate(
+        self,
+        reports: list[IndustryReport],
+        index: dict[str, str]
+    ) -> tuple[list[dict], dict]:
+        frame = self._build_frame(reports, index)
+        top3_reports = self._calculate_top3(reports, frame)
+        sector_stats = self._calculate_sector_stats(reports, frame)
+        return top3_reports, sector_stats
+
+    async def calculate_top3(
+        self,
+        reports: list[IndustryReport],
+        index: dict[str, str]
+    ) -> list[dict]:
+        frame = self._build_frame(reports, index)
+        return self._calculate_top3(reports, frame)
+
+    async def calculate_sector_stats(
+        self,
+        reports: list[IndustryReport],
+        index: dict[str, str]
+    ) -> dict:
+        frame = self._build_frame(reports, index)
+        return self._calculate_sector_stats(reports, frame)
 
     def save_top3_reports_to_local(self, reports: list):
         for report in reports:
@@ -102,5 +338,12 @@ class IndustryManager:
         json_dump_conf = {'indent': 4}
         save_func = save_json_to_local if dist == 'local' else save_json_to_s3
         for report in reports:
-            filename = f'{report["industry"]}_top3.json'
+            filename = f'{self.market.value}/{report["industry"]}_top3.json'
             save_func(filename, report['data'], json_dump_conf, dist=dist)
+
+    def save_sector_stats(self, stats: dict, date_: date, dist: str = 'local'):
+        json_dump_conf = {'indent': 4, 'ensure_ascii': False}
+        save_func = save_json_to_local if dist == 'local' else save_json_to_s3
+        filename = f'{self.market.value}/{date_:%Y%m%d}_sector_stats.json'
+        data = {'date': date_.strftime('%Y-%m-%d'), **stats}
+        save_func(filename, data, json_dump_conf, dist=dist)
@@ -1,16 +1,42 @@
 import re
+from datetime import datetime, timedelta
 from enum import Enum
 from typing import Optional
 
 from pydantic import BaseModel, validator
 
 
+# the names of the industry pages that differ from the listing after the
+# suffix is normalized
+INDUSTRY_NAME_ALIASES = {
+    '金融業': '金融保險業'
+}
+
+
+def normalize_industry_name(name: Optional[str]) -> Optional[str]:
+    if name is None:
+        return name
+    name = name.strip()
+    if name.endswith('類'):
+        name = name[:-1]
+    if not name.endswith('業'):
+        name = f'{name}業'
+    return INDUSTRY_NAME_ALIASES.get(name, name)
+
+
+class Market(Enum):
+    TWSE: str = 'twse'
+    TPEX: str = 'tpex'
+
+
 class Stock(BaseModel):
     ticker: str
     name: Optional[str]
     listed_at: Optional[str]
     industry: Optional[str]
     goes_up: Optional[bool]
+    goes_down: Optional[bool]
+    not_comparable: Optional[bool]
     price: Optional[str]
     price_spread: Optional[str]
     diff: Optional[str]
@@ -20,11 +46,38 @@ class Stock(BaseModel):
         assert re.match(r'\d{4}/\d{2}/\d{2}', v)
         return v
 
+    _industry_rule = validator('industry', allow_reuse=True)(normalize_industry_name)
+
 
 class Industry(BaseModel):
     code: str
     name: str
 
+    _name_rule = validator('name', allow_reuse=True)(normalize_industry_name)
+
+
+class IndustryCatalogue(BaseModel):
+    market: Market
+    industries: list[Industry]
+    skip_industries: dict[str, str]
+    updated_at: datetime
+    # built from the listing of each run, never cached
+    index: dict[str, str] = {}
+
+    @property
+    def reported_industries(self) -> list[Industry]:
+        return [
+            industry for industry in self.industries
+            if industry.code not in self.skip_industries
+        ]
+
+    @staticmethod
+    def build_index(stocks: list[Stock]) -> dict[str, str]:
+        return {stock.ticker: stock.industry for stock in stocks}
+
+    def is_expired(self, ttl: timedelta) -> bool:
+        return datetime.now() - self.updated_at >= ttl
+
 
 class IndustryReport(BaseModel):
     industry: Industry
@@ -38,6 +91,12 @@ class IndustryReportFieldIndex(Enum):
     PRICE_SPREAD: int = 10
 
 
+class TpexIndustryReportFieldIndex(Enum):
+    TICKER: int = 0
+    PRICE: int = 2
+    PRICE_SPREAD: int = 3
+
+
 class StockFieldIndex(Enum):
     TICKER_NAME: int = 0
     LISTED_AT: int = 2
@@ -3,44 +3,73 @@ import httpx
 import json
 import logging
 import re
+import time
 from datetime import date
+from typing import NamedTuple
 from lxml import etree
 
-from app.models import Industry, IndustryReport, Stock
-from app.models import IndustryReportFieldIndex, StockFieldIndex
+from app.models import Industry, IndustryReport, Market, Stock
+from app.models import (
+    IndustryReportFieldIndex,
+    StockFieldIndex,
+    TpexIndustryReportFieldIndex
+)
 
 
 class Parser():
+    root: str = 'https://www.twse.com.tw/zh/'
     endpoint: str = None
     client: httpx.AsyncClient = httpx.AsyncClient()
     retry: int = 8
+    interval: float = 0
+    retry_delay: float = 5
+    latency: float = 0
+    failures: int = 0
+    _schedule: dict[str, float] = {}
+
+    async def pace(self, link):
+        # reserve the next free slot of the host, so that parsers share
+        # the pacing of the same host no matter which market they belong to
+        if not self.interval:
+            return
+        host = httpx.URL(link).host
+        now = time.monotonic()
+        slot = max(now, self._schedule.get(host, now))
+        self._schedule[host] = slot + self.interval
+        await asyncio.sleep(slot - now)
 
     async def get(self, link, **kwargs) -> httpx.Response:
         for _ in range(self.retry):
+            await self.pace(link)
+            start = time.monotonic()
             try:
                 resp = await self.client.get(link, **kwargs)
             except (httpx.ConnectError, httpx.ReadError):
-                await asyncio.sleep(5)
+                self.failures += 1
+                await asyncio.sleep(self.retry_delay)
             except (httpx.ConnectTimeout, httpx.ReadTimeout):
-                await asyncio.sleep(5)
+                self.failures += 1
+                await asyncio.sleep(self.retry_delay)
             else:
+                # the round trip only, the pacing wait is not the host's
+                self.latency = time.monotonic() - start
                 if resp.status_code != 200:
-                    await asyncio.sleep(10)
+                    self.failures += 1
+                    await asyncio.sleep(self.retry_delay * 2)
                 else:
                     return resp
         
         raise RuntimeError
 
     async def init_connect(self):
-        root = 'https://www.twse.com.tw/zh/'
-        await self.get(root)
+        await self.get(self.root)
 
     async def get_html(self, encoding: str = 'utf-8') -> etree.ElementTree:
         resp = await self.get(self.endpoint)
         if (b'Error Code' in resp.content):
             await self.init_connect()
             await asyncio.sleep(1)
-            return await self.get_html(self.endpoint)
+            return await self.get_html(encoding)
         html = etree.HTML(resp.content.decode(encoding))
         return etree.ElementTree(html)
     
@@ -60,6 +89,7 @@ class Parser():
 
 class StockParser(Parser):
     endpoint = 'https://isin.twse.com.tw/isin/C_public.jsp?strMode=2'
+    interval = 1
 
     async def get_stocks(self) -> list[Stock]:
         source = await self.get_html(encoding='MS950')
@@ -72,8 +102,6 @@ class StockParser(Parser):
         ticker_name = columns[StockFieldIndex.TICKER_NAME.value].text
         industry = columns[StockFieldIndex.INDUSTRY.value].text
         ticker, name = ticker_name.strip().split('\u3000')
-        if not industry.endswith('業'):
-            industry = f'{industry}業'
         return Stock(
             ticker=ticker,
             name=name,
@@ -84,6 +112,7 @@ class StockParser(Parser):
 
 class IndustryParser(Parser):
     endpoint = 'https://www.twse.com.tw/zh/page/trading/exchange/MI_INDEX.html'
+    interval = 1
     skip_industries = {
         '07': '化學生技醫療業',
         '13': '綜合業',
@@ -96,26 +125,21 @@ class IndustryParser(Parser):
         pattern = re.compile(r'\d{2}$')
         industries = [
             self._parse_industry(e) for e in elements
-            if (code := e.get('value')) not in self.skip_industries and
-                pattern.match(code)
+            if pattern.match(e.get('value'))
         ]
         return industries
     
     def _parse_industry(self, element: etree.Element) -> Industry:
-        if not (name := element.text).endswith('業'):
-            name = f'{name}業'
-        return Industry(code=element.get('value'), name=name)
+        return Industry(code=element.get('value'), name=element.text)
 
 
 class IndustryReportParser(Parser):
     endpoint = 'https://www.twse.com.tw/exchangeReport/MI_INDEX'
+    # no faster than two parsers sleeping 5 seconds after each report did
+    interval = 2.5
 
     async def get_report(self, industry: Industry, date_: date) -> IndustryReport:
-        params = {
-            'date': date_.strftime('%Y%m%d'),
-            'type': industry.code,
-            'response': 'json'
-        }
+        params = self._build_params(industry, date_)
         data = await self.get_json(params=params)
         try:
             stocks = self._parse_stocks(data)
@@ -124,27 +148,85 @@ class IndustryReportParser(Parser):
 
         return IndustryReport(industry=industry, stocks=stocks)
     
+    def _build_params(self, industry: Industry, date_: date) -> dict:
+        return {
+            'date': date_.strftime('%Y%m%d'),
+            'type': industry.code,
+            'response': 'json'
+        }
+
     def _parse_stocks(self, data: dict) -> list[Stock]:
         up_pattern = '>+<'
+        down_pattern = '>-<'
+        not_comparable_pattern = 'X<'
         return [
             Stock(
                 ticker=datum[IndustryReportFieldIndex.TICKER.value],
                 price=datum[IndustryReportFieldIndex.PRICE.value],
                 goes_up=up_pattern in datum[IndustryReportFieldIndex.GOES_UP.value],
+                goes_down=down_pattern in datum[IndustryReportFieldIndex.GOES_UP.value],
+                not_comparable=not_comparable_pattern in datum[IndustryReportFieldIndex.GOES_UP.value],
                 price_spread=datum[IndustryReportFieldIndex.PRICE_SPREAD.value]
             )
             for datum in data['data1']
         ]
 
-    async def get_reports(
-        self,
-        industries: list[Industry],
-        date_: date
-    ) -> list[IndustryReport]:
-        reports = []
-        for industry in industries:
-            report = await self.get_report(industry, date_)
-            reports.append(report)
-            await asyncio.sleep(5)
-
-        return reports
+
+class TpexStockParser(StockParser):
+    root = 'https://www.tpex.org.tw/web/'
+    endpoint = 'https://isin.twse.com.tw/isin/C_public.jsp?strMode=4'
+
+
+class TpexIndustryParser(IndustryParser):
+    root = 'https://www.tpex.org.tw/web/'
+    endpoint = 'https://www.tpex.org.tw/web/stock/aftertrading/otc_quotes_no1430/stk_wn1430.php?l=zh-tw'
+    skip_industries = {
+        '80': '管理股票業'
+    }
+
+
+class TpexIndustryReportParser(IndustryReportParser):
+    root = 'https://www.tpex.org.tw/web/'
+    endpoint = 'https://www.tpex.org.tw/web/stock/aftertrading/otc_quotes_no1430/stk_wn1430_result.php'
+
+    def _build_params(self, industry: Industry, date_: date) -> dict:
+        return {
+            'l': 'zh-tw',
+            'd': f'{date_.year - 1911}/{date_:%m/%d}',
+            'se': industry.code
+        }
+
+    def _parse_stocks(self, data: dict) -> list[Stock]:
+        stocks = []
+        for datum in data['aaData']:
+            price_spread = datum[TpexIndustryReportFieldIndex.PRICE_SPREAD.value].strip()
+            stocks.append(
+                Stock(
+                    ticker=datum[TpexIndustryReportFieldIndex.TICKER.value],
+                    price=datum[TpexIndustryReportFieldIndex.PRICE.value],
+                    goes_up=price_spread.startswith('+'),
+                    goes_down=price_spread.startswith('-'),
+                    price_spread=price_spread.lstrip('+-')
+                )
+            )
+        return stocks
+
+
+class MarketParsers(NamedTuple):
+    stock: type[StockParser]
+    industry: type[IndustryParser]
+    industry_report: type[IndustryReportParser]
+
+
+MARKET_PARSERS = {
+    Market.TWSE: MarketParsers(
+        stock=StockParser,
+        industry=IndustryParser,
+        industry_report=IndustryReportParser
+    ),
+    Market.TPEX: MarketParsers(
+        stock=TpexStockParser,
+        industry=TpexIndustryParser,
+        industry_report=TpexIndustryReportParser
+    )
+}
@@ -1,12 +1,15 @@
+import asyncio
 import boto3
 import io
 import json
+import numpy as np
 import os
 import pathlib
 
 
 ROOT = pathlib.Path()
 LOCAL_STORAGE = ROOT / 'data'
+CACHE_STORAGE = pathlib.Path(os.environ.get('CACHE_STORAGE', ROOT / '.cache'))
 
 
 def split(l: list, chunks: int) -> list[list]:
@@ -14,11 +17,88 @@ def split(l: list, chunks: int) -> list[list]:
     return [l[i*m+min(i, n):(i+1)*m+min(i+1, n)] for i in range(chunks)]
 
 
+# bound the in-flight requests, raising the limit additively while responses
+# are fast, and cutting it when the moving average of latency goes beyond the
+# target or a response is throttled
+class ConcurrencyController:
+    def __init__(
+        self,
+        initial: int = 2,
+        minimum: int = 1,
+        maximum: int = 4,
+        target_latency: float = 2.0,
+        smoothing: float = 0.2
+    ):
+        self.limit = min(max(initial, minimum), maximum)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.smoothing = smoothing
+        self.latency = None
+        self.in_flight = 0
+        self.successes = 0
+        self.cooldown = 0
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def __aexit__(self, *args):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def record(self, latency: float, throttled: bool = False):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+
+        # the responses of requests sent before the last cut reflect the old
+        # limit, so they should not cut it again, the recording request itself
+        # is still counted in flight
+        if self.cooldown:
+            self.cooldown -= 1
+            if throttled or self.latency > self.target_latency:
+                return
+
+        if throttled:
+            self.limit = max(self.minimum, self.limit - max(1, self.limit // 4))
+            self.successes = 0
+            self.cooldown = max(0, self.in_flight - 1)
+        elif self.latency > self.target_latency:
+            self.limit = max(self.minimum, self.limit - 1)
+            self.successes = 0
+            self.cooldown = max(0, self.in_flight - 1)
+        else:
+            self.successes += 1
+            if self.successes >= self.limit:
+                self.limit = min(self.maximum, self.limit + 1)
+                self.successes = 0
+
+
+def parse_numbers(values: list[str]) -> np.ndarray:
+    # numbers come with thousands separators, and placeholders like `--`
+    # for no trade, which are parsed as nan
+    if not len(values):
+        return np.empty(0)
+    strings = np.char.strip(np.array(values, dtype=str))
+    strings = np.char.replace(strings, ',', '')
+    digits = np.char.replace(strings, '.', '', count=1)
+    valid = np.char.isdigit(digits)
+    numbers = np.full(len(strings), np.nan)
+    numbers[valid] = strings[valid].astype(float)
+    return numbers
+
+
 def save_json_to_local(filename, data, json_dump_conf, **kwargs):
-    if not LOCAL_STORAGE.exists():
-        os.mkdir(LOCAL_STORAGE)
+    path = LOCAL_STORAGE / filename
+    if not path.parent.exists():
+        os.makedirs(path.parent)
     
-    with open(LOCAL_STORAGE / filename, 'w', encoding='utf-8') as f:
+    with open(path, 'w', encoding='utf-8') as f:
         json.dump(data, f, **json_dump_conf)
 
 
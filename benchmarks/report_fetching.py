@@ -0,0 +1,149 @@
+import argparse
+import asyncio
+import math
+import random
+import statistics
+import time
+from datetime import date
+
+from app.managers import IndustryManager
+from app.models import Industry, Market
+from app.parsers import IndustryReportParser, MARKET_PARSERS, Parser
+from app.utils import split
+
+
+# the simulated seconds pass fifty times faster than the real ones
+SCALE = 0.02
+
+
+class SimulatedResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.content = b''
+
+    def json(self) -> dict:
+        return {'data1': []}
+
+
+# answer with a long-tailed latency which grows with the load, and throttle
+# the requests beyond the capacity of the simulated host
+class SimulatedClient:
+    def __init__(self, capacity: int, latency: float):
+        self.rand = random.Random(0)
+        self.capacity = capacity
+        self.median = math.log(latency)
+        self.in_flight = 0
+        self.peak = 0
+        self.throttled = 0
+
+    async def get(self, link, **kwargs) -> SimulatedResponse:
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        latency = min(self.rand.lognormvariate(self.median, 1), 20)
+        latency *= self.in_flight * SCALE
+        status_code = 200
+        if self.in_flight > self.capacity:
+            self.throttled += 1
+            status_code = 429
+        await asyncio.sleep(latency)
+        self.in_flight -= 1
+        return SimulatedResponse(status_code)
+
+
+class SimulatedParser(IndustryReportParser):
+    interval = IndustryReportParser.interval * SCALE
+    retry_delay = Parser.retry_delay * SCALE
+
+
+async def fetch_static(industries: list[Industry], concurrency: int):
+    # the previous fetcher, industries split into fixed chunks walked serially
+    # with a sleep of 5 seconds after each report and no host pacing
+    async def walk(chunk):
+        parser = SimulatedParser()
+        parser.interval = 0
+        for industry in chunk:
+            await parser.get_report(industry, date.today())
+            await asyncio.sleep(5 * SCALE)
+
+    await asyncio.gather(*[walk(chunk) for chunk in split(industries, concurrency)])
+
+
+# the same pacing with a fixed number of requests in flight, to tell the
+# gain of the controller from the gain of the pacing
+class SerialManager(IndustryManager):
+    concurrency = 1
+    min_concurrency = 1
+    max_concurrency = 1
+
+
+class FixedManager(IndustryManager):
+    concurrency = IndustryManager.max_concurrency
+    min_concurrency = IndustryManager.max_concurrency
+
+
+async def fetch_serial(industries: list[Industry]):
+    await SerialManager(Market.TWSE).get_reports(industries, date.today())
+
+
+async def fetch_fixed(industries: list[Industry]):
+    await FixedManager(Market.TWSE).get_reports(industries, date.today())
+
+
+async def fetch_adaptive(industries: list[Industry]):
+    await IndustryManager(Market.TWSE).get_reports(industries, date.today())
+
+
+async def bench(trials: int, industries: int, capacity: int, latency: float):
+    MARKET_PARSERS[Market.TWSE] = MARKET_PARSERS[Market.TWSE]._replace(
+        industry_report=SimulatedParser
+    )
+    IndustryManager.target_latency *= SCALE
+    industries_ = [
+        Industry(code=f'{i:02d}', name=f'industry{i:02d}')
+        for i in range(industries)
+    ]
+
+    for name, fetch in (
+        ('static', lambda: fetch_static(industries_, IndustryManager.concurrency)),
+        ('serial', lambda: fetch_serial(industries_)),
+        ('fixed', lambda: fetch_fixed(industries_)),
+        ('adaptive', lambda: fetch_adaptive(industries_))
+    ):
+        client = SimulatedParser.client = SimulatedClient(capacity, latency)
+        elapsed = []
+        for _ in range(trials):
+            Parser._schedule.clear()
+            start = time.perf_counter()
+            await fetch()
+            elapsed.append((time.perf_counter() - start) / SCALE)
+
+        elapsed.sort()
+        p95 = elapsed[min(len(elapsed) - 1, int(len(elapsed) * 0.95))]
+        print(
+            f'{name:>8}: mean {statistics.mean(elapsed):.1f}s, '
+            f'p95 {p95:.1f}s, max {elapsed[-1]:.1f}s, '
+            f'peak in flight {client.peak}, '
+            f'throttled {client.throttled / trials:.1f} per trial'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='benchmark the industry report fetching against a simulated host'
+    )
+    parser.add_argument('--trials', type=int, default=5)
+    parser.add_argument('--industries', type=int, default=30)
+    parser.add_argument(
+        '--capacity',
+        type=int,
+        default=2,
+        help='the in-flight requests the simulated host serves before throttling'
+    )
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=2,
+        help='the median latency in seconds of a single request to the simulated host'
+    )
+    args = parser.parse_args()
+    asyncio.run(bench(args.trials, args.industries, args.capacity, args.latency))
@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import random
+import time
+
+from app.managers import IndustryManager
+from app.models import Industry, IndustryCatalogue, IndustryReport, Stock
+
+
+def make_day(
+    industries: list[Industry],
+    stocks_per_industry: int,
+    rand: random.Random
+) -> tuple[list[IndustryReport], list[Stock]]:
+    reports, listed = [], []
+    for industry in industries:
+        stocks = []
+        for n in range(stocks_per_industry):
+            ticker = f'{industry.code}{n:02d}'
+            price = rand.uniform(10, 1000)
+            price_spread = price * rand.uniform(0, 0.1)
+            move = rand.choice(('up', 'down', 'flat'))
+            stocks.append(
+                Stock(
+                    ticker=ticker,
+                    goes_up=move == 'up',
+                    goes_down=move == 'down',
+                    price=f'{price:,.2f}',
+                    price_spread=f'{price_spread if move != "flat" else 0:,.2f}'
+                )
+            )
+            listed.append(Stock(ticker=ticker, industry=industry.name))
+        reports.append(IndustryReport(industry=industry, stocks=stocks))
+    return reports, listed
+
+
+async def bench(days: int, industries: int, stocks_per_industry: int):
+    rand = random.Random(0)
+    industries_ = [
+        Industry(code=f'{i:02d}', name=f'industry{i:02d}')
+        for i in range(industries)
+    ]
+    data = [
+        (reports, IndustryCatalogue.build_index(listed))
+        for reports, listed in (
+            make_day(industries_, stocks_per_industry, rand) for _ in range(days)
+        )
+    ]
+
+    manager = IndustryManager()
+    start = time.perf_counter()
+    for reports, index in data:
+        await manager.calculate(reports, index)
+    elapsed = time.perf_counter() - start
+
+    print(f'{days} dates x {industries * stocks_per_industry} stocks')
+    print(f'total {elapsed:.3f}s, {elapsed / days * 1000:.3f}ms per date')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='benchmark the top3 and sector stats calculation over synthetic dates'
+    )
+    parser.add_argument('--days', type=int, default=250)
+    parser.add_argument('--industries', type=int, default=30)
+    parser.add_argument('--stocks', type=int, default=35)
+    args = parser.parse_args()
+    asyncio.run(bench(args.days, args.industries, args.stocks))
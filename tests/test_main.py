@@ -0,0 +1,30 @@
+import asyncio
+import pytest
+from datetime import date
+
+from app.main import main
+from app.models import Market
+
+
+@pytest.mark.asyncio
+async def test_main_isolates_failed_market(monkeypatch):
+    completed = []
+
+    async def mock_run(market, target_date, target_dist):
+        if market == Market.TPEX:
+            raise RuntimeError
+        await asyncio.sleep(0.01)
+        completed.append(market)
+
+    monkeypatch.setattr('app.main.run', mock_run)
+    assert await main(date(2022, 6, 14), 'local') is False
+    assert completed == [Market.TWSE]
+
+
+@pytest.mark.asyncio
+async def test_main_succeeded(monkeypatch):
+    async def mock_run(market, target_date, target_dist):
+        pass
+
+    monkeypatch.setattr('app.main.run', mock_run)
+    assert await main(date(2022, 6, 14), 'local') is True
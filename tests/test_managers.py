@@ -1,7 +1,10 @@
+import asyncio
 import pytest
+from datetime import date, datetime, timedelta
 
-from app.managers import IndustryManager
-from app.models import Industry, IndustryReport, Stock
+from app.managers import CatalogueManager, IndustryManager
+from app.models import Industry, IndustryCatalogue, IndustryReport, Market, Stock
+from app.parsers import IndustryReportParser, MARKET_PARSERS
 
 
 INDUSTRY = Industry(code='01', name='水泥工業')
@@ -17,6 +20,67 @@ STOCKS = [
 ]
 
 
+class MockIndustryReportParser(IndustryReportParser):
+    latencies = {'01': 0.05, '02': 0.01, '03': 0.01, '04': 0.01}
+    warm_ups = 0
+
+    async def init_connect(self):
+        MockIndustryReportParser.warm_ups += 1
+
+    async def get_report(self, industry, date_):
+        await asyncio.sleep(self.latencies[industry.code])
+        return IndustryReport(industry=industry, stocks=[])
+
+
+@pytest.mark.asyncio
+async def test_get_reports(monkeypatch):
+    market_parsers = MARKET_PARSERS[Market.TWSE]._replace(industry_report=MockIndustryReportParser)
+    monkeypatch.setitem(MARKET_PARSERS, Market.TWSE, market_parsers)
+    monkeypatch.setattr(MockIndustryReportParser, 'warm_ups', 0)
+    industries = [
+        Industry(code=code, name=f'industry{code}')
+        for code in MockIndustryReportParser.latencies
+    ]
+
+    manager = IndustryManager(Market.TWSE)
+    reports = await manager.get_reports(industries, date(2022, 6, 14))
+    assert [report.industry for report in reports] == industries
+    assert MockIndustryReportParser.warm_ups == 1
+
+
+@pytest.mark.asyncio
+async def test_get_reports_through_host_pacing(monkeypatch):
+    # the requests are still paced by the host, but a slow response should
+    # not hold back the following ones
+    class MockResponse:
+        status_code = 200
+
+        def json(self):
+            return {'data1': []}
+
+    in_flight, peak = 0, 0
+
+    async def mock_get(link, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.1 if kwargs.get('params', {}).get('type') == '01' else 0.01)
+        in_flight -= 1
+        return MockResponse()
+
+    monkeypatch.setattr(IndustryReportParser.client, 'get', mock_get)
+    monkeypatch.setattr(IndustryReportParser, 'interval', 0.02)
+    monkeypatch.setattr(IndustryReportParser, '_schedule', {})
+    industries = [
+        Industry(code=f'{i:02d}', name=f'industry{i:02d}') for i in range(1, 7)
+    ]
+
+    manager = IndustryManager(Market.TWSE)
+    reports = await manager.get_reports(industries, date(2022, 6, 14))
+    assert [report.industry for report in reports] == industries
+    assert peak > 1
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
     'stocks,stock_scope,results',
@@ -41,5 +105,135 @@ STOCKS = [
 async def test_calculate_top3(stocks, stock_scope, results):
     manager = IndustryManager()
     report = IndustryReport(industry=INDUSTRY, stocks=stocks)
-    top3_results = await manager.calculate_top3([report], stock_scope)
+    index = IndustryCatalogue.build_index(stock_scope)
+    top3_results = await manager.calculate_top3([report], index)
     assert top3_results[0]['data'] == results
+
+
+@pytest.mark.asyncio
+async def test_calculate_sector_stats():
+    stocks = STOCKS + [
+        Stock(ticker='1111', goes_up=False, goes_down=True, price='9.00', price_spread='1.00', industry='水泥工業'),
+        Stock(ticker='1112', goes_up=False, goes_down=False, price='--', price_spread='0.00', industry='水泥工業'),
+        Stock(ticker='1113', goes_up=False, goes_down=False, not_comparable=True, price='20.00', price_spread='0.50', industry='水泥工業'),
+    ]
+    reports = [
+        IndustryReport(industry=INDUSTRY, stocks=stocks),
+        IndustryReport(industry=Industry(code='02', name='食品工業'), stocks=[])
+    ]
+    manager = IndustryManager()
+    index = IndustryCatalogue.build_index(stocks[:-4] + stocks[-3:])
+    stats = await manager.calculate_sector_stats(reports, index)
+    assert stats['industries'][0] == {
+        'industry': '水泥工業',
+        'count': 10,
+        'advancers': 3,
+        'decliners': 1,
+        'unchanged': 4,
+        'not_comparable': 2,
+        'mean_diff': -0.9,
+        'median_diff': 0.0,
+        'up_ratio': 0.375
+    }
+    assert stats['industries'][1] == {
+        'industry': '食品工業',
+        'count': 0,
+        'advancers': 0,
+        'decliners': 0,
+        'unchanged': 0,
+        'not_comparable': 0,
+        'mean_diff': None,
+        'median_diff': None,
+        'up_ratio': None
+    }
+    assert stats['market'] == {
+        'count': 10,
+        'advancers': 3,
+        'decliners': 1,
+        'unchanged': 4,
+        'not_comparable': 2,
+        'mean_diff': -0.9,
+        'median_diff': 0.0,
+        'up_ratio': 0.375
+    }
+
+
+@pytest.mark.asyncio
+async def test_calculate():
+    manager = IndustryManager()
+    report = IndustryReport(industry=INDUSTRY, stocks=STOCKS)
+    index = IndustryCatalogue.build_index(STOCKS[:-1])
+    top3_reports, sector_stats = await manager.calculate([report], index)
+    assert top3_reports == await manager.calculate_top3([report], index)
+    assert sector_stats == await manager.calculate_sector_stats([report], index)
+
+
+@pytest.fixture
+def catalogue_manager(monkeypatch, tmp_path):
+    calls = []
+
+    async def mock_get_industries():
+        calls.append(datetime.now())
+        return [INDUSTRY]
+
+    async def mock_sleep(delay):
+        pass
+
+    monkeypatch.setattr(CatalogueManager, 'catalogues', {})
+    monkeypatch.setattr('app.managers.asyncio.sleep', mock_sleep)
+    manager = CatalogueManager(Market.TWSE)
+    manager.path = tmp_path / 'twse_catalogue.json'
+    monkeypatch.setattr(manager.industry_parser, 'get_industries', mock_get_industries)
+    manager.calls = calls
+    return manager
+
+
+@pytest.mark.asyncio
+class TestCatalogueManager:
+    async def test_get_catalogue(self, catalogue_manager):
+        catalogue = await catalogue_manager.get_catalogue(STOCKS)
+        assert catalogue.industries == [INDUSTRY]
+        assert catalogue.index['1101'] == '水泥工業'
+        assert catalogue.skip_industries['13'] == '綜合業'
+        assert catalogue_manager.path.exists()
+
+        assert await catalogue_manager.get_catalogue(STOCKS) == catalogue
+        assert len(catalogue_manager.calls) == 1
+
+    async def test_get_catalogue_unmatched_industry(self, catalogue_manager, caplog):
+        await catalogue_manager.get_catalogue([Stock(ticker='1201', industry='食品工業')])
+        assert 'industry 水泥工業 matches no listed stock' in caplog.text
+
+    async def test_get_catalogue_from_file(self, catalogue_manager):
+        catalogue = await catalogue_manager.get_catalogue(STOCKS)
+        catalogue_manager.catalogues.clear()
+        cached = catalogue_manager.load()
+        assert cached.industries == catalogue.industries
+        assert cached.skip_industries == catalogue.skip_industries
+        assert cached.index == {}
+        assert await catalogue_manager.get_catalogue(STOCKS) == catalogue
+        assert len(catalogue_manager.calls) == 1
+
+    async def test_get_catalogue_listing_changed(self, catalogue_manager):
+        await catalogue_manager.get_catalogue(STOCKS[:1])
+        stocks = STOCKS[:1] + [Stock(ticker='1102', industry='食品工業')]
+        catalogue = await catalogue_manager.get_catalogue(stocks)
+        assert catalogue.index == {'1101': '水泥工業', '1102': '食品工業'}
+        assert len(catalogue_manager.calls) == 1
+
+    async def test_get_catalogue_expired(self, catalogue_manager):
+        await catalogue_manager.get_catalogue(STOCKS)
+        catalogue_manager.load().updated_at -= CatalogueManager.ttl + timedelta(seconds=1)
+        catalogue = await catalogue_manager.get_catalogue(STOCKS[:1])
+        assert len(catalogue_manager.calls) == 2
+        assert catalogue.index == {'1101': '水泥工業'}
+
+
+def test_catalogue_reported_industries():
+    catalogue = IndustryCatalogue(
+        market=Market.TWSE,
+        industries=[INDUSTRY, Industry(code='13', name='綜合業')],
+        skip_industries={'13': '綜合業'},
+        updated_at=datetime.now()
+    )
+    assert catalogue.reported_industries == [INDUSTRY]
@@ -1,7 +1,7 @@
 import pytest
 from pydantic import ValidationError
 
-from app.models import Stock
+from app.models import Industry, Stock
 
 
 def test_stock_listed_at_validation_passed():
@@ -11,3 +11,18 @@ def test_stock_listed_at_validation_passed():
 def test_stock_listed_at_validation_failed():
     with pytest.raises(ValidationError):
         Stock(ticker='1234', listed_at='19840404')
+
+
+@pytest.mark.parametrize(
+    'name,normalized_name',
+    [
+        ('水泥工業', '水泥工業'),
+        ('其他', '其他業'),
+        ('航運業', '航運業'),
+        ('生技醫療類', '生技醫療業'),
+        ('金融業', '金融保險業')
+    ]
+)
+def test_industry_name_normalization(name, normalized_name):
+    assert Industry(code='01', name=name).name == normalized_name
+    assert Stock(ticker='1234', industry=name).industry == normalized_name
@@ -7,7 +7,10 @@ from app.parsers import (
     IndustryParser,
     IndustryReportParser,
     Parser,
-    StockParser
+    StockParser,
+    TpexIndustryParser,
+    TpexIndustryReportParser,
+    TpexStockParser
 )
 
 
@@ -50,6 +53,7 @@ def mock_response(monkeypatch):
         return mock_resp
 
     monkeypatch.setattr(Parser.client, 'get', mock_get)
+    monkeypatch.setattr(Parser, '_schedule', {})
     return mock_resp
 
 
@@ -77,6 +81,26 @@ class TestParser:
         result = await parser.get_json()
         assert result['msg'] == 'hello world'
     
+    async def test_get_latency_without_pacing(self, mock_response, monkeypatch):
+        monkeypatch.setattr(Parser, 'interval', 0.05)
+
+        parser = Parser()
+        await parser.get('https://example.com/')
+        await parser.get('https://example.com/')
+        assert parser.latency < 0.05
+
+    async def test_get_failed(self, mock_response, monkeypatch):
+        async def mock_sleep(delay):
+            pass
+
+        monkeypatch.setattr('app.parsers.asyncio.sleep', mock_sleep)
+        mock_response.status_code = 429
+
+        parser = Parser()
+        with pytest.raises(RuntimeError):
+            await parser.get('https://example.com/')
+        assert parser.failures == parser.retry
+
     async def test_get_json_failed(self, mock_response):
         mock_response.set_content('error')
 
@@ -84,6 +108,23 @@ class TestParser:
         result = await parser.get_json()
         assert result == None
 
+    async def test_pace(self, monkeypatch):
+        delays = []
+
+        async def mock_sleep(delay):
+            delays.append(delay)
+
+        monkeypatch.setattr(Parser, 'interval', 1)
+        monkeypatch.setattr(Parser, '_schedule', {})
+        monkeypatch.setattr('app.parsers.asyncio.sleep', mock_sleep)
+        monkeypatch.setattr('app.parsers.time.monotonic', lambda: 100)
+
+        parser = Parser()
+        await parser.pace('https://www.twse.com.tw/zh/')
+        await parser.pace('https://www.twse.com.tw/exchangeReport/MI_INDEX')
+        await parser.pace('https://www.tpex.org.tw/web/')
+        assert delays == [0, 1, 0]
+
 
 @pytest.mark.asyncio
 class TestStockParser:
@@ -220,7 +261,7 @@ class TestIndustryParser:
 
         parser = IndustryParser()
         industries = await parser.get_industries()
-        assert len(industries) == 28
+        assert len(industries) == 31
         assert industries[0] == Industry(code='01', name='水泥工業')
         assert industries[-1] == Industry(code='20', name='其他業')
 
@@ -235,7 +276,7 @@ class TestIndustryReportParser:
             "stat":"OK",
             "fields1":["證券代號","證券名稱","成交股數","成交筆數","成交金額","開盤價","最高價","最低價","收盤價","漲跌(+/-)","漲跌價差","最後揭示買價","最後揭示買量","最後揭示賣價","最後揭示賣量","本益比"],
             "subtitle1":"111年06月14日每日收盤行情(水泥工業)",
-            "data1":[["1101","台泥","26,184,653","17,090","1,051,999,654","40.50","40.55","40.05","40.10","<p style= color:green>-<\u002fp>","0.70","40.10","2,284","40.15","529","13.97"],["1101B","台泥乙特","43,581","9","2,242,300","51.40","51.60","51.40","51.60","<p style= color:red>+<\u002fp>","0.10","51.30","5","51.50","10",""],["1102","亞泥","4,235,603","2,274","184,770,459","43.70","43.80","43.50","43.65","<p style= color:green>-<\u002fp>","0.05","43.65","74","43.70","20","10.75"],["1103","嘉泥","241,460","166","4,365,907","18.30","18.30","18.00","18.20","<p style= color:green>-<\u002fp>","0.05","18.15","16","18.25","8","16.70"],["1104","環泥","478,308","379","10,313,347","21.80","21.80","21.40","21.70","<p style= color:green>-<\u002fp>","0.10","21.65","4","21.70","6","10.19"],["1108","幸福","161,010","127","1,739,958","10.80","10.90","10.75","10.85","<p> <\u002fp>","0.00","10.85","2","10.90","11","16.69"],["1109","信大","229,335","169","4,522,230","19.80","19.85","19.65","19.65","<p style= color:green>-<\u002fp>","0.20","19.65","70","19.75","30","10.08"],["1110","東泥","117,002","76","2,234,388","19.35","19.35","18.85","19.25","<p style= color:green>+<\u002fp>","0.10","19.20","3","19.25","2","71.30"]],
+            "data1":[["1101","台泥","26,184,653","17,090","1,051,999,654","40.50","40.55","40.05","40.10","<p style= color:green>-<\u002fp>","0.70","40.10","2,284","40.15","529","13.97"],["1101B","台泥乙特","43,581","9","2,242,300","51.40","51.60","51.40","51.60","<p style= color:red>+<\u002fp>","0.10","51.30","5","51.50","10",""],["1102","亞泥","4,235,603","2,274","184,770,459","43.70","43.80","43.50","43.65","<p style= color:green>-<\u002fp>","0.05","43.65","74","43.70","20","10.75"],["1103","嘉泥","241,460","166","4,365,907","18.30","18.30","18.00","18.20","<p style= color:green>-<\u002fp>","0.05","18.15","16","18.25","8","16.70"],["1104","環泥","478,308","379","10,313,347","21.80","21.80","21.40","21.70","<p style= color:green>-<\u002fp>","0.10","21.65","4","21.70","6","10.19"],["1108","幸福","161,010","127","1,739,958","10.80","10.90","10.75","10.85","<p> <\u002fp>","0.00","10.85","2","10.90","11","16.69"],["1109","信大","229,335","169","4,522,230","19.80","19.85","19.65","19.65","<p style= color:green>-<\u002fp>","0.20","19.65","70","19.75","30","10.08"],["1110","東泥","117,002","76","2,234,388","19.35","19.35","18.85","19.25","<p style= color:green>+<\u002fp>","0.10","19.20","3","19.25","2","71.30"],["1107","建台","0","0","0","--","--","--","--","<p> X<\u002fp>","0.00","","0","","0","0.00"]],
             "date":"20220614",
             "alignsStyle1":[["center","center","center","center","center","center","center","center","center","center","center","center","center","center","center","center"],["left","left","right","right","right","right","right","right","right","center","right","right","right","right","right","right"]]
         }
@@ -250,9 +291,10 @@ class TestIndustryReportParser:
         report = await parser.get_report(industry, date_)
         assert mock_response.request.params == {'date': '20220614', 'type': '01', 'response': 'json'}
         assert report.industry == industry
-        assert len(report.stocks) == 8
-        assert report.stocks[0] == Stock(ticker="1101", price="40.10", goes_up=False, price_spread="0.70")
-        assert report.stocks[-1] == Stock(ticker="1110", price="19.25", goes_up=True, price_spread="0.10")
+        assert len(report.stocks) == 9
+        assert report.stocks[0] == Stock(ticker="1101", price="40.10", goes_up=False, goes_down=True, not_comparable=False, price_spread="0.70")
+        assert report.stocks[-2] == Stock(ticker="1110", price="19.25", goes_up=True, goes_down=False, not_comparable=False, price_spread="0.10")
+        assert report.stocks[-1] == Stock(ticker="1107", price="--", goes_up=False, goes_down=False, not_comparable=True, price_spread="0.00")
     
     async def test_get_report_failed(self, mock_response):
         mock_response.set_content('')
@@ -263,3 +305,169 @@ class TestIndustryReportParser:
         report = await parser.get_report(industry, date_)
         assert report.industry == industry
         assert report.stocks == []
+
+
+@pytest.mark.asyncio
+class TestTpexStockParser:
+    HTML_SOURCE = """
+        <table>
+            <tbody>
+                <tr>
+                    <td bgcolor="#D5FFD5">有價證券代號及名稱 </td>
+                    <td bgcolor="#D5FFD5">國際證券辨識號碼(ISIN Code)</td>
+                    <td bgcolor="#D5FFD5">上市日</td>
+                    <td bgcolor="#D5FFD5">市場別</td>
+                    <td bgcolor="#D5FFD5">產業別</td>
+                    <td bgcolor="#D5FFD5">CFICode</td>
+                    <td bgcolor="#D5FFD5">備註</td>
+                </tr>
+                <tr>
+                    <td bgcolor="#FAFAD2" colspan="7"><b> 股票 <b> </b></b></td>
+                </tr>
+                <tr>
+                    <td bgcolor="#FAFAD2">1258　其祥-KY</td>
+                    <td bgcolor="#FAFAD2">KYG2119F1001</td>
+                    <td bgcolor="#FAFAD2">2014/04/23</td>
+                    <td bgcolor="#FAFAD2">上櫃</td>
+                    <td bgcolor="#FAFAD2">化學工業</td>
+                    <td bgcolor="#FAFAD2">ESVUFR</td>
+                    <td bgcolor="#FAFAD2"></td>
+                </tr>
+                <tr>
+                    <td bgcolor="#FAFAD2">4123　晟德</td>
+                    <td bgcolor="#FAFAD2">TW0004123005</td>
+                    <td bgcolor="#FAFAD2">2000/09/26</td>
+                    <td bgcolor="#FAFAD2">上櫃</td>
+                    <td bgcolor="#FAFAD2">生技醫療業</td>
+                    <td bgcolor="#FAFAD2">ESVUFR</td>
+                    <td bgcolor="#FAFAD2"></td>
+                </tr>
+                <tr>
+                    <td bgcolor="#FAFAD2">5876　上海商銀</td>
+                    <td bgcolor="#FAFAD2">TW0005876007</td>
+                    <td bgcolor="#FAFAD2">2018/10/01</td>
+                    <td bgcolor="#FAFAD2">上櫃</td>
+                    <td bgcolor="#FAFAD2">金融保險業</td>
+                    <td bgcolor="#FAFAD2">ESVUFR</td>
+                    <td bgcolor="#FAFAD2"></td>
+                </tr>
+                <tr>
+                    <td bgcolor="#FAFAD2">6180　橘子</td>
+                    <td bgcolor="#FAFAD2">TW0006180003</td>
+                    <td bgcolor="#FAFAD2">2001/11/29</td>
+                    <td bgcolor="#FAFAD2">上櫃</td>
+                    <td bgcolor="#FAFAD2">文化創意業</td>
+                    <td bgcolor="#FAFAD2">ESVUFR</td>
+                    <td bgcolor="#FAFAD2"></td>
+                </tr>
+                <tr>
+                    <td bgcolor="#FAFAD2">8905　裕國</td>
+                    <td bgcolor="#FAFAD2">TW0008905001</td>
+                    <td bgcolor="#FAFAD2">2002/08/13</td>
+                    <td bgcolor="#FAFAD2">上櫃</td>
+                    <td bgcolor="#FAFAD2">其他</td>
+                    <td bgcolor="#FAFAD2">ESVUFR</td>
+                    <td bgcolor="#FAFAD2"></td>
+                </tr>
+            </tbody>
+        </table>
+    """
+
+    async def test_get_stocks(self, mock_response):
+        mock_response.set_content(self.HTML_SOURCE.encode('MS950'))
+
+        parser = TpexStockParser()
+        stocks = await parser.get_stocks()
+        assert mock_response.request.url == 'https://isin.twse.com.tw/isin/C_public.jsp?strMode=4'
+        assert len(stocks) == 5
+        assert stocks[0] == Stock(ticker='1258', name='其祥-KY', listed_at='2014/04/23', industry='化學工業')
+        assert stocks[-1] == Stock(ticker='8905', name='裕國', listed_at='2002/08/13', industry='其他業')
+
+
+@pytest.mark.asyncio
+class TestTpexIndustryParser:
+    HTML_SOURCE = """
+        <form name="form_sect">
+            資料日期：<input type="text" id="input_date" name="input_date" value="111/06/14">
+            &nbsp;&nbsp;
+            類別：<select name="sect" id="sect">
+                <option value="AL">所有證券(不含權證、牛熊證)</option>
+                <option value="EW">所有證券</option>
+                <option value="02">食品工業</option>
+                <option value="03">塑膠工業</option>
+                <option value="04">紡織纖維</option>
+                <option value="05">電機機械</option>
+                <option value="06">電器電纜</option>
+                <option value="08">玻璃陶瓷</option>
+                <option value="10">鋼鐵工業</option>
+                <option value="11">橡膠工業</option>
+                <option value="14">建材營造</option>
+                <option value="15">航運業</option>
+                <option value="16">觀光事業</option>
+                <option value="17">金融業</option>
+                <option value="18">貿易百貨</option>
+                <option value="20">其他</option>
+                <option value="21">化學工業</option>
+                <option value="22">生技醫療類</option>
+                <option value="23">油電燃氣業</option>
+                <option value="24">半導體業</option>
+                <option value="25">電腦及週邊設備業</option>
+                <option value="26">光電業</option>
+                <option value="27">通信網路業</option>
+                <option value="28">電子零組件業</option>
+                <option value="29">電子通路業</option>
+                <option value="30">資訊服務業</option>
+                <option value="31">其他電子業</option>
+                <option value="32">文化創意業</option>
+                <option value="33">農業科技業</option>
+                <option value="34">電子商務</option>
+                <option value="80">管理股票</option>
+                <option value="AA">受益證券</option>
+                <option value="EE">上櫃指數股票型基金(ETF)</option>
+                <option value="TD">台灣存託憑證(TDR)</option>
+            </select>
+        </form>
+    """
+
+    async def test_get_industries(self, mock_response):
+        mock_response.set_content(self.HTML_SOURCE.encode('utf-8'))
+
+        parser = TpexIndustryParser()
+        industries = await parser.get_industries()
+        assert len(industries) == 29
+        assert industries[0] == Industry(code='02', name='食品工業')
+        assert industries[-1] == Industry(code='80', name='管理股票業')
+
+    async def test_industries_match_listing(self, mock_response):
+        mock_response.set_content(self.HTML_SOURCE.encode('utf-8'))
+        industries = await TpexIndustryParser().get_industries()
+        mock_response.set_content(TestTpexStockParser.HTML_SOURCE.encode('MS950'))
+        stocks = await TpexStockParser().get_stocks()
+
+        names = {industry.name for industry in industries}
+        assert {stock.industry for stock in stocks} <= names
+
+
+@pytest.mark.asyncio
+class TestTpexIndustryReportParser:
+    JSON_SOURCE = """
+        {
+            "reportDate":"111/06/14",
+            "iTotalRecords":3,
+            "aaData":[["1258","其祥-KY","31.90","-0.35 ","32.20","32.25","31.90","32.04","46,140","1,478,380","38","31.90","1","32.00","4","19,513,680","31.99","35.15","28.75"],["4303","信立","23.00","+0.30 ","22.70","23.10","22.70","22.96","42,004","964,453","31","22.85","2","23.00","3","54,547,066","23.00","24.97","20.43"],["4754","國碳科","30.40","0.00 ","30.40","30.40","30.40","30.40","1,000","30,400","1","30.10","1","30.45","1","82,545,212","30.40","33.40","27.40"]]
+        }
+    """
+
+    async def test_get_report(self, mock_response):
+        mock_response.set_content(self.JSON_SOURCE)
+
+        parser = TpexIndustryReportParser()
+        industry = Industry(code='03', name='塑膠工業')
+        date_ = date(2022, 6, 14)
+        report = await parser.get_report(industry, date_)
+        assert mock_response.request.params == {'l': 'zh-tw', 'd': '111/06/14', 'se': '03'}
+        assert report.industry == industry
+        assert len(report.stocks) == 3
+        assert report.stocks[0] == Stock(ticker="1258", price="31.90", goes_up=False, goes_down=True, price_spread="0.35")
+        assert report.stocks[1] == Stock(ticker="4303", price="23.00", goes_up=True, goes_down=False, price_spread="0.30")
+        assert report.stocks[2] == Stock(ticker="4754", price="30.40", goes_up=False, goes_down=False, price_spread="0.00")
@@ -1,6 +1,7 @@
+import asyncio
 import pytest
 
-from app.utils import split
+from app.utils import ConcurrencyController, split
 
 
 TEST_LIST = [1] * 20
@@ -20,3 +21,69 @@ TEST_LIST = [1] * 20
 def test_split_func(list_, chunks, length_of_each_chunk):
     result = [len(_) for _ in split(list_, chunks)]
     assert result == length_of_each_chunk
+
+
+@pytest.mark.parametrize(
+    'records,limit',
+    [
+        ([(0.5, False)] * 2, 3),
+        ([(0.5, False)] * 5, 4),
+        ([(0.5, False)] * 20, 4),
+        ([(3.0, False)], 1),
+        ([(3.0, False)] * 5, 1),
+        ([(0.5, False)] * 5 + [(0.5, True)], 3),
+        ([(0.5, False)] * 5 + [(0.5, True)] * 2, 2),
+        ([(0.5, False)] * 2 + [(3.0, False)], 3),
+        ([(0.5, False)] * 2 + [(5.0, False)] * 3, 1)
+    ]
+)
+def test_concurrency_controller_record(records, limit):
+    controller = ConcurrencyController(initial=2, minimum=1, maximum=4, target_latency=2.0)
+    for latency, throttled in records:
+        controller.record(latency, throttled)
+    assert controller.limit == limit
+
+
+def test_concurrency_controller_cooldown():
+    controller = ConcurrencyController(initial=4, minimum=1, maximum=4)
+    controller.in_flight = 3
+    controller.record(0.5, throttled=True)
+    controller.record(0.5, throttled=True)
+    controller.record(0.5, throttled=True)
+    assert controller.limit == 3
+    controller.record(0.5, throttled=True)
+    assert controller.limit == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrency_controller_limit():
+    controller = ConcurrencyController(initial=2, minimum=1, maximum=4)
+    peak = 0
+
+    async def work():
+        nonlocal peak
+        async with controller:
+            peak = max(peak, controller.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*[work() for _ in range(6)])
+    assert peak == 2
+    assert controller.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_controller_lowered_limit():
+    controller = ConcurrencyController(initial=4, minimum=1, maximum=4)
+    entered = []
+
+    async def work(i):
+        async with controller:
+            entered.append(i)
+            if i == 0:
+                controller.record(0.5, throttled=True)
+                controller.record(0.5, throttled=True)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*[work(i) for i in range(8)])
+    assert controller.limit < 4
+    assert sorted(entered) == list(range(8))